@@ -12,6 +12,12 @@ Cisco IBNS version 1 or 2 templates will be applied based on switch model.
 Catalyst 3750 series switches will receive IBNS version 1 and all other
 switch models will receive IBNS version 2.
 
+Switch models are cached per site in "output/<site>_model_cache.json" (or
+"output/model_cache.json" without a site code), keyed by inventory host name
+and management address, and reused on later runs instead of running
+"show version". The cached model decides the IBNS version applied, so set
+DOT1X_REFRESH_MODELS=1 to re-detect every model after replacing a switch.
+
 Additional required variables from Source of Truth (SimpleInventory):
 
 location:           SNMP location
@@ -38,16 +44,120 @@ excluded_intf:      list of ports that will be excluded from dot1x
 
 """
 
+import hashlib
 import json
+import os
+import re
 import sys
-from getpass import getpass
 from nornir import InitNornir
 from nornir.plugins.tasks.networking import netmiko_send_command
 from nornir.plugins.tasks.networking import netmiko_send_config
 from nornir.plugins.tasks.networking import netmiko_save_config
 from nornir.plugins.tasks.networking import napalm_configure
-from nornir.plugins.tasks import text
-from ttp import ttp
+from jinja2 import __version__ as jinja2_version
+from jinja2 import Environment
+from jinja2 import FileSystemBytecodeCache
+from jinja2 import FileSystemLoader
+from jinja2 import StrictUndefined
+from jinja2 import TemplateError
+from jinja2 import TemplateNotFound
+
+
+# template directory and Jinja2 options compiled into the templates
+TEMPLATE_DIR = "templates/"
+JINJA_OPTIONS = {
+    "undefined": StrictUndefined,
+    "trim_blocks": True,
+    "lstrip_blocks": True,
+    "keep_trailing_newline": False,
+}
+# on-disk cache of compiled templates, reused across script runs; Jinja2 only
+# keys cached bytecode on the template source, so keep a separate directory
+# per Jinja2 version, template directory and set of options
+JINJA_CACHE_FINGERPRINT = hashlib.sha1(
+    repr(
+        (
+            jinja2_version,
+            os.path.abspath(TEMPLATE_DIR),
+            sorted(JINJA_OPTIONS.items()),
+        )
+    ).encode("utf-8")
+).hexdigest()[:12]
+JINJA_CACHE_DIR = os.path.join(
+    os.path.expanduser("~/.cache/nornir_dot1xer"), JINJA_CACHE_FINGERPRINT
+)
+
+# shared Jinja2 environment; compiled templates are cached for every host
+ENV = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    bytecode_cache=FileSystemBytecodeCache(directory=JINJA_CACHE_DIR),
+    auto_reload=False,
+    cache_size=-1,
+    **JINJA_OPTIONS,
+)
+# compiled templates keyed by file name
+PRECOMPILED = {}
+# IBNS template file names
+GLOBAL_TEMPLATE_RE = re.compile(r"IBNS(v[^_]+)_(.+)_global\.j2")
+ACCESS_TEMPLATE_RE = re.compile(r"IBNS(v[^_]+)_access_intf\.j2")
+# compiled templates keyed by (IBNS version, region) and IBNS version
+GLOBAL_TEMPLATES = {}
+ACCESS_TEMPLATES = {}
+# switch model patterns and their IBNS version, first match wins
+MODEL_PATTERNS = (
+    # 3750V2's use IBNSv1
+    ("3750V2", "v1"),
+    ("3750G", "v1"),
+    # 3750X's use IBNSv2-modified
+    ("3750X", "v2-alt"),
+)
+# all else use IBNSv2
+DEFAULT_IBNS = "v2"
+# every IBNS version a switch can be given
+IBNS_VERSIONS = tuple(
+    dict.fromkeys((DEFAULT_IBNS, *(ver for pattern, ver in MODEL_PATTERNS)))
+)
+# IBNS version descriptions for printing
+IBNS_NAMES = {
+    "v1": "IBNS version 1",
+    "v2": "IBNS version 2",
+    "v2-alt": "IBNS version 2 (modified)",
+}
+# host data used by each group of templates
+GLOBAL_VARS = ("ise_key", "mgmt_src", "vlan_list") + tuple(
+    f"ise_vip_{cluster}_{field}"
+    for cluster in "abcd"
+    for field in ("name", "ip", "psn1", "psn2")
+)
+SNMP_VARS = (
+    "acl",
+    "location",
+    "snmpv2_key1",
+    "snmpv2_key2",
+    "snmp3_user",
+    "snmpv3_view",
+    "snmpv3_hash",
+)
+UPLINK_INTF_VARS = ("uplink_interfaces",)
+ACCESS_INTF_VARS = ("access_interfaces",)
+L3VLAN_INTF_VARS = ("l3_vlan_int",) + tuple(
+    f"ise_vip_{cluster}_ip" for cluster in "abcd"
+)
+# centered text with newline before and after
+BANNER = "\n{:^80}\n"
+# static banners for the proceed prompt
+PROCEED_BANNER = BANNER.format("********** PROCEED? **********")
+EXITING_BANNER = BANNER.format("******* EXITING SCRIPT *******")
+PROCEEDING_BANNER = BANNER.format("********* PROCEEDING *********")
+# dot1x status from "show dot1x all"
+SYSAUTH_RE = re.compile(r"Sysauthcontrol\s+(\S+)")
+# switch models from previous runs per site, keyed by host name and address
+MODEL_CACHE_FILE = "output/{site_}model_cache.json"
+# models saved by previous runs, and models used or detected by this run
+SAVED_MODELS = {}
+MODEL_CACHE = {}
+# set to re-detect every switch model instead of using the cache
+REFRESH_MODELS_VAR = "DOT1X_REFRESH_MODELS"
 
 
 # print formatting function
@@ -55,7 +165,7 @@ def c_print(printme):
     """
     Function to print centered text with newline before and after
     """
-    print(f"\n" + printme.center(80, " ") + "\n")
+    print(BANNER.format(printme))
 
 
 # continue banner
@@ -63,16 +173,16 @@ def proceed():
     """
     Function to prompt to proceed or exit script
     """
-    c_print("********** PROCEED? **********")
+    print(PROCEED_BANNER)
     # capture user input
     confirm = input(" " * 36 + "(y/n) ")
     # quit script if not confirmed
     if confirm.lower() != "y":
-        c_print("******* EXITING SCRIPT *******")
+        print(EXITING_BANNER)
         print("~" * 80)
         exit()
     else:
-        c_print("********* PROCEEDING *********")
+        print(PROCEEDING_BANNER)
 
 
 # test Nornir textfsm result
@@ -93,21 +203,26 @@ def test_norn(task, result):
         c_print(f"*** {task.host}: ERROR running Nornir task ***")
 
 
-# set device credentials
-def kickoff():
+# get site code
+def site_code():
     """
-    Nornir kickoff function to initialize inventory and set or confirm credentials
+    Function to return the site code from the arguments and its file prefix
     """
     # check arguments for site code
     if len(sys.argv) < 2:
         # set no site code
-        site = ""
-        site_ = ""
+        return "", ""
 
-    else:
-        # set site code
-        site = sys.argv[1]
-        site_ = sys.argv[1] + "_"
+    # set site code
+    return sys.argv[1], sys.argv[1] + "_"
+
+
+# set device credentials
+def kickoff():
+    """
+    Nornir kickoff function to initialize inventory and set or confirm credentials
+    """
+    site, site_ = site_code()
 
     # print banner
     print()
@@ -142,6 +257,9 @@ def kickoff():
         for host in nr.inventory.hosts.keys():
             c_print(f"*** {host} ***")
 
+    # run one worker per host, up to 100 concurrent sessions
+    nr.config.core.num_workers = min(len(nr.inventory.hosts), 100)
+
     c_print("Checking inventory for credentials")
     # check for existing credentials in inventory
 
@@ -152,6 +270,9 @@ def kickoff():
             nr.inventory.defaults.username = input("Username: ")
 
         if nr.inventory.defaults.password == None:
+            # import only when prompting for a password
+            from getpass import getpass
+
             nr.inventory.defaults.password = getpass()
             print()
 
@@ -159,6 +280,161 @@ def kickoff():
     return nr
 
 
+# compile templates
+def load_templates():
+    """
+    Function to compile all templates once before running tasks on hosts;
+    exit before connecting to any devices if a template is missing or invalid
+    """
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+
+    except OSError as error:
+        c_print(f"*** Template cache error: {error} ***")
+        print("~" * 80)
+        sys.exit(1)
+
+    try:
+        for name in ENV.list_templates(extensions=["j2"]):
+            PRECOMPILED[name] = ENV.get_template(name)
+        # index IBNS templates by version and region
+        for name, template in PRECOMPILED.items():
+            match = GLOBAL_TEMPLATE_RE.fullmatch(name)
+            if match:
+                GLOBAL_TEMPLATES[match.groups()] = template
+            match = ACCESS_TEMPLATE_RE.fullmatch(name)
+            if match:
+                ACCESS_TEMPLATES[match.group(1)] = template
+        # every IBNS version needs an access interface template
+        for ver in IBNS_VERSIONS:
+            if ver not in ACCESS_TEMPLATES:
+                raise TemplateNotFound(f"IBNS{ver}_access_intf.j2")
+
+    except TemplateError as error:
+        c_print(f"*** Template error: {error} ***")
+        print("~" * 80)
+        sys.exit(1)
+
+
+# choose IBNS version
+def pick_ibns(sw_model):
+    """
+    Function to choose IBNS version based on switch model
+    """
+    for pattern, ver in MODEL_PATTERNS:
+        if pattern in sw_model:
+            return ver
+    # all else use IBNSv2
+    return DEFAULT_IBNS
+
+
+# prepare inventory data
+def prepare_inventory(nr):
+    """
+    Function to build vlan and port data once at each inventory level
+    rather than once per host
+    """
+    inventory = nr.inventory
+    for element in (
+        inventory.defaults,
+        *inventory.groups.values(),
+        *inventory.hosts.values(),
+    ):
+        data = element.data
+        if "vlans" in data:
+            # create vlan_list string in inventory order
+            data["vlan_list"] = ",".join(str(vlan) for vlan in data["vlans"])
+            # convert vlans in inventory from int to a set of str
+            data["vlans"] = {str(vlan) for vlan in data["vlans"]}
+        # convert port lists to sets for interface lookups
+        for key in ("uplinks", "excluded_intf"):
+            if key in data:
+                data[key] = set(data[key])
+
+    # check every host region has global templates for each IBNS version
+    errors = []
+    for host in inventory.hosts.values():
+        region = host.get("region")
+        if region is None:
+            errors.append(f"*** {host}: no region set in inventory ***")
+            continue
+        for ver in IBNS_VERSIONS:
+            if (ver, region) not in GLOBAL_TEMPLATES:
+                errors.append(
+                    f"*** {host}: missing template IBNS{ver}_{region}_global.j2 ***"
+                )
+
+    if errors:
+        for error in errors:
+            c_print(error)
+        print("~" * 80)
+        sys.exit(1)
+
+
+# load cached switch models
+def load_model_cache(site_):
+    """
+    Function to load switch models saved by previous runs at this site
+    """
+    cache_file = MODEL_CACHE_FILE.format(site_=site_)
+    if not os.path.exists(cache_file):
+        return
+
+    try:
+        with open(cache_file) as file:
+            models = json.load(file)
+        if type(models) != dict:
+            raise ValueError("expected a JSON object")
+
+    except (OSError, ValueError) as error:
+        # unreadable cache, detect every model again
+        c_print(f"*** Ignoring switch model cache {cache_file}: {error} ***")
+        return
+
+    SAVED_MODELS.update(models)
+    # skip the cache if asked to re-detect models
+    if os.environ.get(REFRESH_MODELS_VAR) == "1":
+        c_print("Re-detecting all switch models")
+        return
+
+    MODEL_CACHE.update(models)
+    c_print(f"Using cached switch models from {cache_file}")
+    c_print(f"Set {REFRESH_MODELS_VAR}=1 to re-detect switch models")
+
+
+# save cached switch models
+def save_model_cache(site_):
+    """
+    Function to save switch models for future runs at this site; keep saved
+    models for hosts not detected by this run
+    """
+    cache_file = MODEL_CACHE_FILE.format(site_=site_)
+    models = {**SAVED_MODELS, **MODEL_CACHE}
+    # write a temp file and swap it in so an interrupted write keeps the old cache
+    temp_file = f"{cache_file}.tmp"
+    try:
+        with open(temp_file, "w") as file:
+            json.dump(models, file, indent=4, sort_keys=True)
+        os.replace(temp_file, cache_file)
+
+    except OSError as error:
+        c_print(f"*** Unable to save switch model cache {cache_file}: {error} ***")
+
+
+# build template context
+def render_context(task, keys):
+    """
+    Function to collect only the host data a template uses
+    """
+    context = {}
+    for key in keys:
+        value = task.host.get(key)
+        # leave missing data undefined so the template raises on it
+        if value is not None:
+            context[key] = value
+    return context
+
+
 # enable SCP
 def scp_enable(task):
     """
@@ -185,18 +461,27 @@ def get_info(task):
     """
     Nornir task to get software version; use TextFSM
     """
-    cmd = "show version"
-    sh_version = task.run(
-        task=netmiko_send_command, command_string=cmd, use_textfsm=True
-    )
-    # test Nornir result
-    test_norn_textfsm(task, sh_version.result, cmd)
-    # save show version output to task.host
-    task.host["sh_version"] = sh_version.result[0]
-    # pull model from show version
-    sw_model = task.host["sh_version"]["hardware"][0].split("-")
-    # save model to task.host
-    task.host["sw_model"] = sw_model[1]
+    # use model cached by a previous run for this host name and address
+    cache_key = f"{task.host.name}@{task.host.hostname}"
+    if cache_key in MODEL_CACHE:
+        task.host["sw_model"] = MODEL_CACHE[cache_key]
+        c_print(f"*** {task.host}: {task.host['sw_model']} (cached model) ***")
+
+    else:
+        cmd = "show version"
+        sh_version = task.run(
+            task=netmiko_send_command, command_string=cmd, use_textfsm=True
+        )
+        # test Nornir result
+        test_norn_textfsm(task, sh_version.result, cmd)
+        # save show version output to task.host
+        task.host["sh_version"] = sh_version.result[0]
+        # pull model from show version
+        sw_model = task.host["sh_version"]["hardware"][0].split("-")
+        # save model to task.host and cache
+        task.host["sw_model"] = sw_model[1]
+        MODEL_CACHE[cache_key] = task.host["sw_model"]
+
     # get interfaces; use TextFSM
     cmd = "show interface switchport"
     interfaces = task.run(
@@ -204,32 +489,15 @@ def get_info(task):
     )
     # test Nornir result
     test_norn_textfsm(task, interfaces.result, cmd)
-    # save interfaces to task.host
-    task.host["intfs"] = interfaces.result
-    # convert vlans in inventory from int to str
-    vlans = []
-    for vlan in task.host["vlans"]:
-        vlans.append(str(vlan))
-    # save list of vlans strings back to task.host
-    task.host["vlans"] = vlans
-    # create vlan_list string
-    task.host["vlan_list"] = ",".join(task.host["vlans"])
+    # save interface names and access vlans to task.host
+    task.host["intfs"] = [
+        {"interface": intf["interface"], "access_vlan": intf["access_vlan"]}
+        for intf in interfaces.result
+    ]
 
     # choose template based on switch model
-    if "3750V2" in task.host["sw_model"] or "3750G" in task.host["sw_model"]:
-        # 3750V2's use IBNSv1
-        task.host["ibns_ver"] = "v1"
-        c_print(f"*** {task.host}: IBNS version 1 ***")
-
-    elif "3750X" in task.host["sw_model"]:
-        # 3750X's use IBNSv2-modified
-        task.host["ibns_ver"] = "v2-alt"
-        c_print(f"*** {task.host}: IBNS version 2 (modified) ***")
-
-    else:
-        # all else use IBNSv2
-        task.host["ibns_ver"] = "v2"
-        c_print(f"*** {task.host}: IBNS version 2 ***")
+    task.host["ibns_ver"] = pick_ibns(task.host["sw_model"])
+    c_print(f"*** {task.host}: {IBNS_NAMES[task.host['ibns_ver']]} ***")
 
     # get ip interface brief; use TextFSM
     cmd = "show ip interface brief | e unas"
@@ -247,14 +515,14 @@ def ibns_global(task):
     """
     Nornir task to render global IBNS dot1x  configurations
     """
-    global_cfg = task.run(
-        task=text.template_file,
-        template=f"IBNS{task.host['ibns_ver']}_{task.host['region']}_global.j2",
-        path="templates/",
-        **task.host,
+    ver, region = task.host["ibns_ver"], task.host["region"]
+    if (ver, region) not in GLOBAL_TEMPLATES:
+        raise TemplateNotFound(f"IBNS{ver}_{region}_global.j2")
+    global_cfg = GLOBAL_TEMPLATES[(ver, region)].render(
+        **render_context(task, GLOBAL_VARS)
     )
     # return configuration
-    return global_cfg.result
+    return global_cfg
 
 
 # render IBNS snmp config templates
@@ -262,14 +530,11 @@ def ibns_snmp(task):
     """
     Nornir task to render global IBNS dot1x  configurations
     """
-    snmp_cfg = task.run(
-        task=text.template_file,
-        template=f"IBNS_snmp.j2",
-        path="templates/",
-        **task.host,
+    snmp_cfg = PRECOMPILED["IBNS_snmp.j2"].render(
+        **render_context(task, SNMP_VARS)
     )
     # return configuration
-    return snmp_cfg.result
+    return snmp_cfg
 
 
 # IBNS interface config templates
@@ -277,38 +542,33 @@ def ibns_intf(task):
     """
     Nornir task to render interface IBNS dot1x  configurations
     """
-    # init lists of interfaces
-    access_interfaces = []
-    uplink_interfaces = []
-    # iterate over all interfaces
-    for intf in task.host["intfs"]:
-
-        # uplink interfaces
-        if intf["interface"] in task.host["uplinks"]:
-            uplink_interfaces.append(intf)
-
-        # other non-excluded access ports
-        elif intf["interface"] not in task.host["excluded_intf"]:
-            if intf["access_vlan"] in task.host["vlans"]:
-                access_interfaces.append(intf)
+    # look up host data once for all interfaces
+    intfs = task.host["intfs"]
+    uplinks = task.host["uplinks"]
+    excluded = task.host["excluded_intf"]
+    vlans = task.host["vlans"]
+    # uplink interfaces
+    uplink_interfaces = [intf for intf in intfs if intf["interface"] in uplinks]
+    # other non-excluded access ports
+    access_interfaces = [
+        intf
+        for intf in intfs
+        if intf["interface"] not in uplinks
+        and intf["interface"] not in excluded
+        and intf["access_vlan"] in vlans
+    ]
 
     # assign uplink interface list to task.host
     task.host["uplink_interfaces"] = uplink_interfaces
     # render uplink interface configs
-    uplink_intf_cfg = task.run(
-        task=text.template_file,
-        template="IBNS_uplink_intf.j2",
-        path="templates/",
-        **task.host,
+    uplink_intf_cfg = PRECOMPILED["IBNS_uplink_intf.j2"].render(
+        **render_context(task, UPLINK_INTF_VARS)
     )
     # assign access interface list to task.host
     task.host["access_interfaces"] = access_interfaces
     # render access interface configs
-    access_intf_cfg = task.run(
-        task=text.template_file,
-        template=f"IBNS{task.host['ibns_ver']}_access_intf.j2",
-        path="templates/",
-        **task.host,
+    access_intf_cfg = ACCESS_TEMPLATES[task.host["ibns_ver"]].render(
+        **render_context(task, ACCESS_INTF_VARS)
     )
 
     # init list of L3 vlan interfaces
@@ -335,15 +595,45 @@ def ibns_intf(task):
         L3VLAN_template = "IBNS_L3VLAN_intf.j2"
 
     # render L3 vlan interface configs
-    l3_vlan_int_cfg = task.run(
-        task=text.template_file,
-        template=L3VLAN_template,
-        path="templates/",
-        **task.host,
+    l3_vlan_int_cfg = PRECOMPILED[L3VLAN_template].render(
+        **render_context(task, L3VLAN_INTF_VARS)
     )
 
     # return configuration
-    return uplink_intf_cfg.result + access_intf_cfg.result + l3_vlan_int_cfg.result
+    return uplink_intf_cfg + access_intf_cfg + l3_vlan_int_cfg
+
+
+# write rendered config
+def write_config(task, key, path, cfg):
+    """
+    Function to write a rendered config to file and keep it on task.host
+    """
+    with open(path, "wb") as file:
+        file.write(cfg.encode("utf-8"))
+    file_stat = os.stat(path)
+    task.host[key] = {
+        "path": path,
+        "cfg": cfg,
+        "stat": (file_stat.st_mtime_ns, file_stat.st_size),
+    }
+
+
+# read rendered config
+def read_config(task, key):
+    """
+    Function to return a rendered config; re-read the file if it was edited
+    after rendering
+    """
+    rendered = task.host[key]
+    file_stat = os.stat(rendered["path"])
+    # unchanged file, apply config kept in memory
+    if (file_stat.st_mtime_ns, file_stat.st_size) == rendered["stat"]:
+        return rendered["cfg"]
+
+    with open(rendered["path"], "rb") as file:
+        cfg = file.read().decode("utf-8")
+    c_print(f"*** {task.host}: applying edited {rendered['path']} ***")
+    return cfg
 
 
 # render switch configs
@@ -355,24 +645,23 @@ def render_configs(task):
     # run function to render global configs
     global_cfg = ibns_global(task)
     # write global config file for each host
-    with open(f"configs/{task.host}_dot1x_global.txt", "w+") as file:
-        file.write(global_cfg)
+    write_config(
+        task, "global_cfg", f"configs/{task.host}_dot1x_global.txt", global_cfg
+    )
     # print completed hosts
     c_print(f"*** {task.host}: dot1x global configuration rendered ***")
 
     # run function to render snmp configs
     snmp_cfg = ibns_snmp(task)
     # function to run interface configs
-    with open(f"configs/{task.host}_snmp.txt", "w+") as file:
-        file.write(snmp_cfg)
+    write_config(task, "snmp_cfg", f"configs/{task.host}_snmp.txt", snmp_cfg)
     # print completed hosts
     c_print(f"*** {task.host}: SNMP configuration rendered ***")
 
     # run function to run interface configs
     intf_cfg = ibns_intf(task)
     # write interface config file for each host
-    with open(f"configs/{task.host}_dot1x_intf.txt", "w+") as file:
-        file.write(intf_cfg)
+    write_config(task, "intf_cfg", f"configs/{task.host}_dot1x_intf.txt", intf_cfg)
     # print completed hosts
     c_print(f"*** {task.host}: dot1x intf configurations rendered ***")
 
@@ -426,6 +715,15 @@ def aaa_3750x(task):
         c_print(f"*** {task.host}: authentication display new-style enabled ***")
 
 
+# gather switch info and render switch configs
+def collect_and_render(task):
+    """
+    Nornir task to get switch info and render configurations in one pass
+    """
+    get_info(task)
+    render_configs(task)
+
+
 # apply switch configs
 def apply_configs(task):
     """
@@ -436,16 +734,16 @@ def apply_configs(task):
         # run 3750X function
         aaa_3750x(task)
 
-    # apply global config file for each host
-    task.run(task=napalm_configure, filename=f"configs/{task.host}_dot1x_global.txt")
+    # apply global config for each host
+    task.run(task=napalm_configure, configuration=read_config(task, "global_cfg"))
     # print completed hosts
     c_print(f"*** {task.host}: dot1x global configuration applied ***")
-    # apply snmp config file for each host
-    task.run(task=napalm_configure, filename=f"configs/{task.host}_snmp.txt")
+    # apply snmp config for each host
+    task.run(task=napalm_configure, configuration=read_config(task, "snmp_cfg"))
     # print completed hosts
     c_print(f"*** {task.host}: SNMP configuration applied ***")
-    # apply interface config file for each host
-    task.run(task=napalm_configure, filename=f"configs/{task.host}_dot1x_intf.txt")
+    # apply interface config for each host
+    task.run(task=napalm_configure, configuration=read_config(task, "intf_cfg"))
     # print completed hosts
     c_print(f"*** {task.host}: dot1x interface configuration applied ***")
 
@@ -457,19 +755,16 @@ def verify_dot1x(task):
     """
     # run "show dot1x all" on each host
     sh_dot1x = task.run(task=netmiko_send_command, command_string="show dot1x all")
-    # TTP template for dot1x status
-    dot1x_ttp_template = "Sysauthcontrol              {{ status }}"
-    # magic TTP parsing
-    parser = ttp(data=sh_dot1x.result, template=dot1x_ttp_template)
-    parser.parse()
-    dot1x_status = json.loads(parser.result(format="json")[0])
+    # parse dot1x status
+    match = SYSAUTH_RE.search(sh_dot1x.result)
+    dot1x_status = match.group(1) if match else "UNKNOWN"
 
     # write dot1x verification report for each host
-    with open(f"output/{task.host}_dot1x_verified.txt", "w+") as file:
-        file.write(sh_dot1x.result)
+    with open(f"output/{task.host}_dot1x_verified.txt", "wb") as file:
+        file.write(sh_dot1x.result.encode("utf-8"))
 
     # print dot1x status
-    c_print(f"*** {task.host} dot1x status: {dot1x_status[0]['status']} ***")
+    c_print(f"*** {task.host} dot1x status: {dot1x_status} ***")
 
 
 # main function
@@ -477,8 +772,15 @@ def main():
     """
     Main function and script logic
     """
+    # compile templates before kicking off The Norn
+    load_templates()
     # kickoff The Norn
     nr = kickoff()
+    # build vlan and port data from inventory
+    prepare_inventory(nr)
+    # load switch models from previous runs at this site
+    _, site_ = site_code()
+    load_model_cache(site_)
 
     # enable SCP
     c_print(f"Enabling SCP for NAPALM on all devices")
@@ -487,24 +789,21 @@ def main():
     c_print(f"Failed hosts: {nr.data.failed_hosts}")
     print("~" * 80)
 
-    # gather switch info
-    c_print("Gathering device configurations")
-    # run The Norn to get info
-    nr.run(task=get_info)
-    # print failed hosts
-    c_print(f"Failed hosts: {nr.data.failed_hosts}")
-    print("~" * 80)
-
-    # render switch configs
-    c_print(f"Rendering IBNS dot1x configurations")
-    # run The Norn to render dot1x config
-    nr.run(task=render_configs)
+    # gather switch info and render switch configs
+    c_print(
+        "Gathering device configurations and rendering IBNS dot1x configurations"
+    )
+    # run The Norn to get info and render config
+    nr.run(task=collect_and_render)
+    # save switch models for future runs
+    save_model_cache(site_)
     # print failed hosts
     c_print(f"Failed hosts: {nr.data.failed_hosts}")
     print("~" * 80)
 
     # apply switch configs
     c_print(f"Applying IBNS dot1x configuration files to all devices")
+    c_print("Files in configs/ edited before proceeding will be applied as edited")
     # prompt to proceed
     proceed()
     # run The Norn to apply config files
@@ -530,6 +829,9 @@ def main():
     c_print(f"Failed hosts: {nr.data.failed_hosts}")
     print("~" * 80)
 
+    # close device connections kept open across all tasks
+    nr.close_connections(on_failed=True)
+
 
 if __name__ == "__main__":
     main()